@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2007-2010 AG-Projects.
+#
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from application.configuration.datatypes import NetworkRangeList
+from xcap.datatypes import AddressRangeSet
+del sys.path[0]
+
+
+def address(s):
+    a, b, c, d = [int(x) for x in s.split('.')]
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+class AddressRangeSetTest(unittest.TestCase):
+
+    def test_merged_ranges(self):
+        ranges = AddressRangeSet(NetworkRangeList('10.0.0.0/8, 10.1.0.0/16, 192.168.1.0/24, 192.168.2.0/24, 172.16.0.1'))
+        self.assertEqual(len(ranges.starts), 3)
+        for ip in ('10.0.0.0', '10.1.2.3', '10.255.255.255', '172.16.0.1', '192.168.1.0', '192.168.2.255'):
+            self.assert_(address(ip) in ranges, ip)
+        for ip in ('0.0.0.0', '9.255.255.255', '11.0.0.0', '172.16.0.0', '172.16.0.2', '192.168.0.255', '192.168.3.0', '255.255.255.255'):
+            self.failIf(address(ip) in ranges, ip)
+
+    def test_any(self):
+        ranges = AddressRangeSet(NetworkRangeList('any'))
+        for ip in ('0.0.0.0', '10.1.2.3', '255.255.255.255'):
+            self.assert_(address(ip) in ranges, ip)
+
+    def test_none(self):
+        for value in (None, NetworkRangeList('none'), []):
+            ranges = AddressRangeSet(value)
+            self.failIf(address('10.1.2.3') in ranges)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2007-2010 AG-Projects.
+#
+
+import os
+import sys
+import shutil
+import socket
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from application.process import process
+from xcap import workers
+del sys.path[0]
+
+
+class WorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_config = process.system_config_directory, workers.ServerConfig.workers
+        self.config_directory = tempfile.mkdtemp()
+        process.system_config_directory = self.config_directory
+        self.write_config('http://xcap.example.com/xcap-root', 'OpenSIPS')
+
+    def tearDown(self):
+        process.system_config_directory, workers.ServerConfig.workers = self.saved_config
+        shutil.rmtree(self.config_directory)
+
+    def write_config(self, root, backend):
+        f = open(os.path.join(self.config_directory, 'config.ini'), 'w')
+        try:
+            f.write('[Server]\nroot = %s\nbackend = %s\n' % (root, backend))
+        finally:
+            f.close()
+        # forget the cached configuration file, it may have been read in the same second
+        workers.ConfigFile.instances.clear()
+
+    def test_single_worker(self):
+        workers.ServerConfig.workers = 1
+        self.failIf(workers.multiple_workers_enabled())
+        self.assertEqual(workers.spawn_workers(), (0, []))
+
+    def test_unsupported_configurations(self):
+        workers.ServerConfig.workers = 3
+        for root, backend in (('https://xcap.example.com/xcap-root', 'OpenSIPS'),
+                              ('http://xcap.example.com/xcap-root', 'SIPThor'),
+                              ('', 'OpenSIPS')):
+            self.write_config(root, backend)
+            self.failIf(workers.multiple_workers_supported(), (root, backend))
+            self.assertEqual(workers.spawn_workers(), (0, []))
+
+    def test_spawn_workers(self):
+        if not workers.multiple_workers_supported():
+            return
+        workers.ServerConfig.workers = 3
+        number, children = workers.spawn_workers()
+        if number:
+            os._exit(0)
+        self.assertEqual(len(children), 2)
+        workers.stop_workers(children)
+        for pid in children:
+            self.assertRaises(OSError, os.kill, pid, 0)
+
+    def test_listen_socket(self):
+        if workers.SO_REUSEPORT is None:
+            return
+        s1 = workers.listen_socket('127.0.0.1', 0)
+        try:
+            port = s1.getsockname()[1]
+            s2 = workers.listen_socket('127.0.0.1', port)
+            try:
+                self.assertEqual(s2.getsockname(), ('127.0.0.1', port))
+                self.assert_(s2.getsockopt(socket.SOL_SOCKET, workers.SO_REUSEPORT))
+                self.assert_(s2.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY))
+            finally:
+                s2.close()
+        finally:
+            s1.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,7 +21,7 @@ import socket
 import urlparse
 
 import xcap
-from xcap.datatypes import XCAPRootURI
+from xcap.datatypes import XCAPRootURI, AddressRangeSet
 from xcap.appusage import getApplicationForURI, namespaces, public_get_applications
 from xcap.errors import ResourceNotFound
 from xcap.uri import XCAPUser, XCAPUri
@@ -107,20 +107,7 @@ class TrustedPeerCredentials(object):
         self.peer = peer
 
     def checkPeer(self, trusted_peers):
-        for range in trusted_peers:
-            if struct.unpack('!L', socket.inet_aton(self.peer))[0] & range[1] == range[0]:
-                return True
-        return False
-
-class IPublicGetApplicationCredentials(credentials.ICredentials):
-    def checkApplication(self):
-        pass
-
-class PublicGetApplicationCredentials(object):
-    implements(IPublicGetApplicationCredentials)
-
-    def checkApplication(self):
-        return True
+        return struct.unpack('!L', socket.inet_aton(self.peer))[0] in trusted_peers
 
 ## credentials checkers
 
@@ -129,7 +116,7 @@ class TrustedPeerChecker(object):
     credentialInterfaces = (ITrustedPeerCredentials,)
 
     def __init__(self, trusted_peers):
-        self.trusted_peers = trusted_peers
+        self.trusted_peers = AddressRangeSet(trusted_peers)
 
     def requestAvatarId(self, credentials):
         """Return the avatar ID for the credentials which must have a 'peer' attribute,
@@ -138,17 +125,6 @@ class TrustedPeerChecker(object):
             return defer.succeed(credentials.peer)
         return defer.fail(credError.UnauthorizedLogin())
 
-class PublicGetApplicationChecker(object):
-    implements(checkers.ICredentialsChecker)
-    credentialInterfaces = (IPublicGetApplicationCredentials,)
-
-    def requestAvatarId(self, credentials):
-        """We already know that the method is GET and the application is a 'public GET application',
-           we just need to say that the authentication succeeded."""
-        if credentials.checkApplication():
-            return defer.succeed(None)
-        return defer.fail(credError.UnauthorizedLogin())
-
 ## avatars
 
 class IAuthUser(Interface):
@@ -185,8 +161,6 @@ class XCAPAuthRealm(object):
             return IAuthUser, AuthUser(avatarId)
         elif ITrustedPeer in interfaces:
             return ITrustedPeer, TrustedPeer(avatarId)
-        elif IPublicGetApplication in interfaces:
-            return IPublicGetApplication, PublicGetApplication(avatarId)
 
         raise NotImplementedError("Only IAuthUser and ITrustedPeer interfaces are supported")
 
@@ -239,15 +213,10 @@ class XCAPAuthResource(HTTPAuthResource):
 
         self._updateRealm(realm)
 
-        # If we receive a GET to a 'public GET application' we will not authenticate it
+        # If we receive a GET to a 'public GET application' we will not authenticate it,
+        # there is no need to go through the portal as this always succeeds
         if request.method == "GET" and public_get_applications.has_key(xcap_uri.application_id):
-            return self.portal.login(PublicGetApplicationCredentials(),
-                                     None,
-                                     IPublicGetApplication
-                                     ).addCallbacks(self._loginSucceeded,
-                                                    self._publicGetApplicationLoginFailed,
-                                                    (request,), None,
-                                                    (request,), None)
+            return defer.maybeDeferred(self._loginSucceeded, (IPublicGetApplication, PublicGetApplication(None)), request)
 
         remote_addr = request.remoteAddr.host
         if AuthenticationConfig.trusted_peers:
@@ -265,9 +234,6 @@ class XCAPAuthResource(HTTPAuthResource):
         """If the peer is not trusted, fallback to HTTP basic/digest authentication."""
         return HTTPAuthResource.authenticate(self, request)
 
-    def _publicGetApplicationLoginFailed(self, result, request):
-        return HTTPAuthResource.authenticate(self, request)
-
     def _loginSucceeded(self, avatar, request):
         """Authorizes an XCAP request after it has been authenticated."""
 
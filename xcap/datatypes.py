@@ -1,6 +1,7 @@
 
 """Configuration data types"""
 
+import bisect
 import re
 import urlparse
 from application import log
@@ -64,3 +65,24 @@ class XCAPRootURI(str):
         else:
             raise ValueError("Invalid port specified")
 
+
+class AddressRangeSet(object):
+    """The address ranges from a NetworkRangeList, merged into sorted and disjoint
+       intervals, so that an address can be looked up with a binary search."""
+
+    def __init__(self, network_ranges):
+        self.starts = []
+        self.ends = []
+        # the NetworkRangeList setting is None when no ranges are configured
+        network_ranges = network_ranges or ()
+        for start, end in sorted((network, network | (~mask & 0xffffffff)) for network, mask in network_ranges):
+            if self.ends and start <= self.ends[-1] + 1:
+                self.ends[-1] = max(self.ends[-1], end)
+            else:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def __contains__(self, address):
+        index = bisect.bisect_right(self.starts, address) - 1
+        return index >= 0 and address <= self.ends[index]
+
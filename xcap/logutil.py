@@ -260,12 +260,61 @@ class IsNotAccessLog(logging.Filter):
     def filter(self, record):
         return not isinstance(record.msg, AccessLog)
 
+class AccessLogHandler(RotatingFileHandler):
+    """Rotating log file handler which buffers the records and writes them
+       in batches, when the buffer is full or the oldest record is older
+       than the flush interval."""
+
+    def __init__(self, filename, maxBytes, backupCount, capacity=1024, interval=1.0):
+        RotatingFileHandler.__init__(self, filename, 'a', maxBytes, backupCount)
+        self.capacity = capacity
+        self.interval = interval
+        self.buffer = []
+        self._writing = False
+
+    def emit(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.capacity or record.created - self.buffer[0].created >= self.interval:
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            # the base class emit() flushes the stream after each record, that
+            # is postponed until the whole buffer has been written
+            if self._writing:
+                return
+            self._writing = True
+            try:
+                buffer, self.buffer = self.buffer, []
+                for record in buffer:
+                    RotatingFileHandler.emit(self, record)
+            finally:
+                self._writing = False
+            RotatingFileHandler.flush(self)
+        finally:
+            self.release()
+
+def flush_access_log():
+    for handler in log.logger.handlers:
+        if isinstance(handler, AccessLogHandler):
+            handler.flush()
+
 def start_log():
     log.start_syslog('openxcap')
+    # create the directory before the workers are forked, they would race to do it
+    if Logging.directory and not os.path.exists(Logging.directory):
+        os.mkdir(Logging.directory)
+
+def start_access_log(worker=0):
+    """Each worker process writes to its own access log file, as the rotation
+       of a log file cannot be shared between processes."""
     if Logging.directory:
-        if not os.path.exists(Logging.directory):
-            os.mkdir(Logging.directory)
-        handler = RotatingFileHandler(os.path.join(Logging.directory, 'access.log'), 'a', 2*1024*1024, 5)
+        if worker:
+            filename = 'access-%d.log' % worker
+        else:
+            filename = 'access.log'
+        handler = AccessLogHandler(os.path.join(Logging.directory, filename), 2*1024*1024, 5)
         handler.addFilter(IsAccessLog())
         log.logger.addHandler(handler)
         for handler in log.logger.handlers:
@@ -4,6 +4,7 @@
 from __future__ import absolute_import
 
 import resource as _resource
+import socket
 import sys
 
 from application.configuration.datatypes import IPAddress, NetworkRangeList
@@ -11,6 +12,7 @@ from application.configuration import ConfigSection, ConfigSetting
 from application import log
 
 from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
 from twisted.web2 import channel, resource, http, responsecode, http_headers, server
 from twisted.cred.portal import Portal
 from twisted.web2.auth import basic
@@ -22,13 +24,29 @@ from xcap import authentication
 from xcap.datatypes import XCAPRootURI
 from xcap.appusage import getApplicationForURI, Backend
 from xcap.resource import XCAPDocument, XCAPElement, XCAPAttribute, XCAPNamespaceBinding
-from xcap.logutil import log_access, log_error
+from xcap.logutil import log_access, log_error, flush_access_log
 from xcap.tls import Certificate, PrivateKey
+from xcap.workers import listen_socket, multiple_workers_enabled
 from xcap.xpath import AttributeSelector, NamespaceSelector
 
 
 server.VERSION = "OpenXCAP/%s" % xcap.__version__
 
+
+# the second and the formatted value of the last generated Date header
+_date_header = [None, None]
+
+def generateDate(secSinceEpoch):
+    """Generate the Date header, formatting it only once per second"""
+    seconds = int(secSinceEpoch)
+    if _date_header[0] != seconds:
+        _date_header[:] = [seconds, http_headers.generateDateTime(seconds)]
+    return _date_header[1]
+
+http_headers.generator_general_headers["Date"] = (generateDate, http_headers.singleHeader)
+http_headers.DefaultHTTPHandler.updateGenerators(http_headers.generator_general_headers)
+del generateDate
+
 class AuthenticationConfig(ConfigSection):
     __cfgfile__ = xcap.__cfgfile__
     __section__ = 'Authentication'
@@ -45,6 +63,8 @@ class ServerConfig(ConfigSection):
     address = ConfigSetting(type=IPAddress, value='0.0.0.0')
     root = ConfigSetting(type=XCAPRootURI, value=None)
     backend = ConfigSetting(type=Backend, value=None)
+    connection_timeout = 30
+    keepalive_timeout = 300
 
 class TLSConfig(ConfigSection):
     __cfgfile__ = xcap.__cfgfile__
@@ -62,60 +82,75 @@ if ServerConfig.backend is None:
     sys.exit(1)
 
 
-# Increase the system limit for the maximum number of open file descriptors
-try:
-    _resource.setrlimit(_resource.RLIMIT_NOFILE, (99999, 99999))
-except ValueError:
+# Increase the system limit for the maximum number of open file descriptors,
+# falling back to the hard limit if it cannot be raised (not running as root),
+# and accept connections only while there is room left for the descriptors
+# used by the backend and the logging
+_soft_limit, _hard_limit = _resource.getrlimit(_resource.RLIMIT_NOFILE)
+if _hard_limit == _resource.RLIM_INFINITY:
+    _fd_limit = 99999
+else:
+    _fd_limit = max(_hard_limit, 99999)
+for _limits in ((_fd_limit, _fd_limit), (_hard_limit, _hard_limit)):
+    try:
+        _resource.setrlimit(_resource.RLIMIT_NOFILE, _limits)
+    except ValueError:
+        continue
+    break
+else:
     log.warn("Could not raise open file descriptor limit")
+_fd_limit = _resource.getrlimit(_resource.RLIMIT_NOFILE)[0]
+if _fd_limit == _resource.RLIM_INFINITY:
+    _fd_limit = 99999
+_max_connections = int(_fd_limit * 0.9)
 
 
 class XCAPRoot(resource.Resource, resource.LeafResource):
     addSlash = True
 
+    # resource class by terminal selector type, node selectors without one address elements
+    terminal_resources = {AttributeSelector: XCAPAttribute, NamespaceSelector: XCAPNamespaceBinding}
+
     def allowedMethods(self):
         # not used , but methods were already checked by XCAPAuthResource
         return ('GET', 'PUT', 'DELETE')
 
-    def resourceForURI(self, xcap_uri):
-        application = getApplicationForURI(xcap_uri)
+    def resourceForURI(self, xcap_uri, application=None):
+        if application is None:
+            application = getApplicationForURI(xcap_uri)
         if not xcap_uri.node_selector:
             return XCAPDocument(xcap_uri, application)
         else:
             terminal_selector = xcap_uri.node_selector.terminal_selector
-            if isinstance(terminal_selector, AttributeSelector):
-                return XCAPAttribute(xcap_uri, application)
-            elif isinstance(terminal_selector, NamespaceSelector):
-                return XCAPNamespaceBinding(xcap_uri, application)
-            else:
-                return XCAPElement(xcap_uri, application)
+            resource_class = self.terminal_resources.get(type(terminal_selector), XCAPElement)
+            return resource_class(xcap_uri, application)
 
     def renderHTTP(self, request):
         application = getApplicationForURI(request.xcap_uri)
         if not application:
             return http.Response(responsecode.NOT_FOUND, stream="Application not supported")
-        resource = self.resourceForURI(request.xcap_uri)
+        resource = self.resourceForURI(request.xcap_uri, application)
         return resource.renderHTTP(request)
 
 
+_TEXT_PLAIN = http_headers.MimeType('text', 'plain')
+
 def get_response_body(exc):
-    if hasattr(exc, 'stream') and hasattr(exc.stream, 'mem'):
+    try:
         return exc.stream.mem
-    else:
+    except AttributeError:
         return str(exc)
 
 class Request(server.Request):
-
-    def __init__(self, *args, **kw):
-        server.Request.__init__(self, *args, **kw)
+    _reason = None
 
     def writeResponse(self, response):
-        reason = getattr(self, '_reason', None)
+        reason = self._reason
         log_access(self, response, reason)
         try:
             return server.Request.writeResponse(self, response)
         finally:
-            if reason is not None:
-                del self._reason
+            self._reason = None
 
     def _processingFailed(self, reason):
         # save the reason, it will be used for the stacktrace
@@ -126,14 +161,14 @@ class Request(server.Request):
             # if the exception has 'http_error' and it is HTTPError, we use it to generate the response.
             # this allows us to attach http_error to non-HTTPError errors (as opposed to
             # re-raising HTTPError-derived exception) and enjoy the original stacktraces in the log
-            if not isinstance(exc, http.HTTPError) and hasattr(exc, 'http_error'):
-                http_error = exc.http_error
+            http_error = getattr(exc, 'http_error', None)
+            if http_error is not None and not isinstance(exc, http.HTTPError):
                 if isinstance(http_error, http.HTTPError):
                     return server.Request._processingFailed(self, failure.Failure(http_error))
                 elif isinstance(http_error, int):
                     s = get_response_body(exc)
                     response = http.Response(http_error,
-                                             {'content-type': http_headers.MimeType('text','plain')},
+                                             {'content-type': _TEXT_PLAIN},
                                              stream=s)
                     fail = failure.Failure(http.HTTPError(response))
                     return server.Request._processingFailed(self, fail)
@@ -143,7 +178,7 @@ class Request(server.Request):
     def renderHTTP_exception(self, req, reason):
         response = http.Response(
             responsecode.INTERNAL_SERVER_ERROR,
-            {'content-type': http_headers.MimeType('text','plain')},
+            {'content-type': _TEXT_PLAIN},
             ("An error occurred while processing the request. "
              "More information is available in the server log."))
 
@@ -151,32 +186,25 @@ class Request(server.Request):
         return response
 
 
-class HTTPChannelRequest(channel.http.HTTPChannelRequest):
-    _base = channel.http.HTTPChannelRequest
-
-    def gotInitialLine(self, line):
-        self._initial_line = line
-        return self._base.gotInitialLine(self, line)
-
-    def createRequest(self):
-        self._base.createRequest(self)
-        self.request._initial_line = self._initial_line
-
-
 class HTTPChannel(channel.http.HTTPChannel):
-    chanRequestFactory = HTTPChannelRequest
-    inputTimeOut = 30
+    """Pipelined requests are answered in order: web2 buffers the output of a
+       queued channel request until the ones before it have been written."""
+
+    inputTimeOut = ServerConfig.connection_timeout
+    # idle time allowed between requests on a persistent connection, long
+    # enough for polling clients to avoid a new TCP and TLS handshake
+    betweenRequestsTimeOut = ServerConfig.keepalive_timeout
 
     def __init__(self):
         channel.http.HTTPChannel.__init__(self)
-        # if connection wasn't completed for 30 seconds, terminate it,
+        # if connection wasn't completed in time, terminate it,
         # this avoids having lingering TCP connections which don't complete
         # the TLS handshake
-        self.setTimeout(30)
+        self.setTimeout(self.inputTimeOut)
 
     def timeoutConnection(self):
         if self.transport:
-            log.msg("Timing out client: %s" % str(self.transport.getPeer()))
+            log.msg("Timing out client: %s" % self.transport.getPeer())
             channel.http.HTTPChannel.timeoutConnection(self)
 
 
@@ -187,8 +215,8 @@ class HTTPFactory(channel.HTTPFactory):
 
 class XCAPSite(server.Site):
 
-    def __call__(self, *args, **kwargs):
-        return Request(site=self, *args, **kwargs)
+    def __call__(self, chanRequest, command, path, version, contentLength, headers):
+        return Request(chanRequest, command, path, version, contentLength, headers, site=self)
 
 
 class XCAPServer(object):
@@ -202,7 +230,6 @@ class XCAPServer(object):
         portal.registerChecker(http_checker)
         trusted_peers = AuthenticationConfig.trusted_peers
         portal.registerChecker(authentication.TrustedPeerChecker(trusted_peers))
-        portal.registerChecker(authentication.PublicGetApplicationChecker())
 
         auth_type = AuthenticationConfig.type
         if auth_type == 'basic':
@@ -216,6 +243,7 @@ class XCAPServer(object):
                                                (credential_factory,),
                                                portal, (authentication.IAuthUser,))
         self.site = XCAPSite(root)
+        self.factory = HTTPFactory(self.site, maxRequests=_max_connections)
 
     def _start_https(self, reactor):
         from gnutls.interfaces.twisted import TLSContext, X509Credentials
@@ -225,7 +253,7 @@ class XCAPServer(object):
             sys.exit(1)
         credentials = X509Credentials(cert, pKey)
         tls_context = TLSContext(credentials)
-        reactor.listenTLS(ServerConfig.root.port, HTTPFactory(self.site), tls_context, interface=ServerConfig.address)
+        reactor.listenTLS(ServerConfig.root.port, self.factory, tls_context, interface=ServerConfig.address)
         log.msg("TLS started")
 
     def start(self):
@@ -233,7 +261,13 @@ class XCAPServer(object):
         log.msg("XCAP root: %s" % ServerConfig.root)
         if ServerConfig.root.startswith('https'):
             self._start_https(reactor)
+        elif multiple_workers_enabled():
+            sock = listen_socket(ServerConfig.address, ServerConfig.root.port)
+            reactor.adoptStreamPort(sock.fileno(), socket.AF_INET, self.factory)
+            sock.close()
         else:
-            reactor.listenTCP(ServerConfig.root.port, HTTPFactory(self.site), interface=ServerConfig.address)
+            reactor.listenTCP(ServerConfig.root.port, self.factory, interface=ServerConfig.address)
+        LoopingCall(flush_access_log).start(1.0, now=False)
+        reactor.addSystemEventTrigger('after', 'shutdown', flush_access_log)
         reactor.run(installSignalHandlers=ServerConfig.backend.installSignalHandlers)
 
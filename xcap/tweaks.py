@@ -1,4 +1,5 @@
 
+from base64 import b64encode
 from hashlib import md5
 from twisted.cred import credentials, error
 from twisted.web2.auth.digest import IUsernameDigestHash, DigestCredentialFactory
@@ -56,6 +57,5 @@ class tweak_DigestCredentialFactory(DigestCredentialFactory):
             clientip = ''
         key = "%s,%s,%s" % (nonce, clientip, now)
         digest = md5(key + self.privateKey).hexdigest()
-        ekey = key.encode('base64')
-        return "%s-%s" % (digest, ekey.replace('\n', ''))
+        return "%s-%s" % (digest, b64encode(key))
 
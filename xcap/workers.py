@@ -0,0 +1,93 @@
+
+"""Support for running the XCAP server in multiple worker processes"""
+
+import os
+import signal
+import socket
+
+from application import log
+from application.configuration import ConfigFile, ConfigSection
+
+import xcap
+
+
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', None)
+
+
+class ServerConfig(ConfigSection):
+    __cfgfile__ = xcap.__cfgfile__
+    __section__ = 'Server'
+
+    workers = 1
+
+
+def _unsupported_reason():
+    # root and backend are defined by xcap.server, which cannot be imported before
+    # the workers are forked, only their raw values are needed here
+    config_file = ConfigFile(xcap.__cfgfile__)
+    root = config_file.get_setting('Server', 'root').strip()
+    backend = config_file.get_setting('Server', 'backend').strip().lower()
+    if SO_REUSEPORT is None:
+        return "SO_REUSEPORT is not available on this platform"
+    if not root:
+        return "the XCAP root URI is not defined"
+    if root.startswith('https'):
+        # python-gnutls cannot listen on a socket created by us
+        return "the XCAP root URI is https"
+    if backend == 'sipthor':
+        # each worker would join the SIP Thor network as the same node
+        return "the SIPThor backend is used"
+    return None
+
+def multiple_workers_supported():
+    return _unsupported_reason() is None
+
+def multiple_workers_enabled():
+    return ServerConfig.workers > 1 and multiple_workers_supported()
+
+def spawn_workers():
+    """Fork the additional worker processes requested in the configuration.
+       This must be called before the twisted reactor is installed, as a
+       reactor cannot be shared between processes. Returns the number of
+       the current worker (0 for the parent process) and the list with the
+       PIDs of the workers (empty in a worker)."""
+    if ServerConfig.workers <= 1:
+        return 0, []
+    reason = _unsupported_reason()
+    if reason is not None:
+        log.warn("Multiple workers are not supported because %s, running a single process" % reason)
+        return 0, []
+    children = []
+    for number in xrange(1, ServerConfig.workers):
+        pid = os.fork()
+        if pid == 0:
+            return number, []
+        children.append(pid)
+    return 0, children
+
+def stop_workers(children):
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+
+def listen_socket(address, port, backlog=50):
+    """Create a listening socket which shares the port with the other workers.
+       The kernel distributes the incoming connections between them."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+    s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if hasattr(socket, 'TCP_DEFER_ACCEPT'):
+        s.setsockopt(socket.IPPROTO_TCP, socket.TCP_DEFER_ACCEPT, 1)
+    s.bind((address, port))
+    s.listen(backlog)
+    s.setblocking(False)
+    return s
+